@@ -1,8 +1,11 @@
 import asyncio
-from datetime import datetime, timedelta
+import time
+from collections import defaultdict
 
 import structlog
 from fastapi import HTTPException, status
+from redis.asyncio import Redis
+from redis.exceptions import NoScriptError
 
 logger = structlog.get_logger()
 
@@ -10,32 +13,101 @@ logger = structlog.get_logger()
 class RateLimiter:
     def __init__(self, requests_per_minute: int = 60):
         self.requests_per_minute = requests_per_minute
-        self.requests: dict[str, list] = {}
-        self._lock = asyncio.Lock()
+        # Token bucket per key: (tokens, last_refill). Refills continuously at
+        # requests_per_minute / 60 tokens per second, capped at requests_per_minute.
+        self.buckets: dict[str, tuple[float, float]] = {}
+        # Keys are validated API keys, so this stays as small as settings.api_keys.
+        self._locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
 
     async def check_rate_limit(self, key: str) -> None:
-        async with self._lock:
-            now = datetime.now()
-            minute_ago = now - timedelta(minutes=1)
+        async with self._locks[key]:
+            rpm = self.requests_per_minute
+            now = time.monotonic()
 
-            if key not in self.requests:
-                self.requests[key] = []
+            tokens, last_refill = self.buckets.get(key, (rpm, now))
+            tokens = min(rpm, tokens + (now - last_refill) * rpm / 60.0)
 
-            self.requests[key] = [
-                timestamp for timestamp in self.requests[key] if timestamp > minute_ago
-            ]
-
-            if len(self.requests[key]) >= self.requests_per_minute:
+            if tokens < 1:
+                self.buckets[key] = (tokens, now)
                 logger.warning(f"Rate limit exceeded for key: {key[:8]}...")
                 raise HTTPException(
                     status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                     detail=f"Rate limit exceeded. Maximum {self.requests_per_minute} requests per minute.",
                 )
 
-            self.requests[key].append(now)
+            self.buckets[key] = (tokens - 1, now)
 
     async def reset(self, key: str) -> None:
-        async with self._lock:
-            if key in self.requests:
-                del self.requests[key]
+        async with self._locks[key]:
+            if key in self.buckets:
+                del self.buckets[key]
                 logger.info(f"Rate limit reset for key: {key[:8]}...")
+
+
+# Token bucket evaluated atomically on the Redis server so every API worker
+# shares one bucket per key. KEYS[1] = bucket key, ARGV[1] = capacity
+# (requests per window), ARGV[2] = window in seconds. Returns 1 if allowed.
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2]) * 1000
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(bucket[1]) or capacity
+local last_refill = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + (now - last_refill) * capacity / window_ms)
+
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+
+redis.call("HSET", KEYS[1], "tokens", tokens, "ts", now)
+redis.call("PEXPIRE", KEYS[1], window_ms)
+return allowed
+"""
+
+
+class RedisRateLimiter:
+    def __init__(self, redis_url: str, requests_per_minute: int = 60):
+        self.requests_per_minute = requests_per_minute
+        self.redis = Redis.from_url(redis_url)
+        self._script_sha: str | None = None
+
+    async def load_script(self) -> str:
+        self._script_sha = await self.redis.script_load(_TOKEN_BUCKET_LUA)
+        logger.info("Loaded rate limit script", sha=self._script_sha)
+        return self._script_sha
+
+    async def _consume(self, bucket_key: str) -> int:
+        script_sha = self._script_sha or await self.load_script()
+
+        try:
+            allowed = await self.redis.evalsha(
+                script_sha, 1, bucket_key, self.requests_per_minute, 60
+            )
+        except NoScriptError:
+            # Script cache is flushed on Redis restart; reload and retry once.
+            script_sha = await self.load_script()
+            allowed = await self.redis.evalsha(
+                script_sha, 1, bucket_key, self.requests_per_minute, 60
+            )
+        return int(allowed)
+
+    async def check_rate_limit(self, key: str) -> None:
+        if not await self._consume(f"rl:{key}"):
+            logger.warning(f"Rate limit exceeded for key: {key[:8]}...")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded. Maximum {self.requests_per_minute} requests per minute.",
+            )
+
+    async def reset(self, key: str) -> None:
+        if await self.redis.delete(f"rl:{key}"):
+            logger.info(f"Rate limit reset for key: {key[:8]}...")
+
+    async def close(self) -> None:
+        await self.redis.aclose()
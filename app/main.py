@@ -1,7 +1,7 @@
-import uuid
 from contextlib import asynccontextmanager
 from typing import Any, Literal
 
+import orjson
 import structlog
 from fastapi import Depends, FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
@@ -11,11 +11,19 @@ from pydantic import BaseModel, Field
 import app.models.runners
 from app.config import settings
 from app.deps.auth import verify_api_key
-from app.deps.ratelimit import RateLimiter
+from app.deps.ratelimit import RateLimiter, RedisRateLimiter
 from app.models.registry import ModelRegistry
+from app.services.batching import TaskBatcher
 from app.services.metrics import setup_metrics, task_status_checked, task_submitted
 from app.tasks.celery_app import celery_app
-from app.utils.idempotency import IdempotencyCache
+from app.utils.idempotency import IdempotencyCache, RedisIdempotencyCache
+from app.utils.ids import uuid7
+
+
+def _orjson_dumps(obj: Any, **kwargs: Any) -> str:
+    # stdlib logging handlers expect str; orjson returns bytes.
+    return orjson.dumps(obj, **kwargs).decode()
+
 
 structlog.configure(
     processors=[
@@ -27,7 +35,7 @@ structlog.configure(
         structlog.processors.StackInfoRenderer(),
         structlog.processors.format_exc_info,
         structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer(),
+        structlog.processors.JSONRenderer(serializer=_orjson_dumps),
     ],
     context_class=dict,
     logger_factory=structlog.stdlib.LoggerFactory(),
@@ -36,6 +44,9 @@ structlog.configure(
 
 logger = structlog.get_logger()
 
+_PRIORITY_NUM = {"high": 9, "normal": 5, "low": 1}
+_QUEUE_NAME = {"high": "gpu-high", "normal": "gpu-normal", "low": "gpu-low"}
+
 
 class TaskRequest(BaseModel):
     model: str = Field(..., description="Model name to use for inference")
@@ -66,8 +77,19 @@ async def lifespan(app: FastAPI):
     available_models = ModelRegistry.list_models()
     logger.info(f"Available models: {available_models}")
 
+    if isinstance(rate_limiter, RedisRateLimiter):
+        await rate_limiter.load_script()
+
     yield
 
+    # Don't drop tasks still waiting for their batching window.
+    await task_batcher.flush_all()
+
+    if isinstance(rate_limiter, RedisRateLimiter):
+        await rate_limiter.close()
+    if isinstance(idempotency_cache, RedisIdempotencyCache):
+        await idempotency_cache.close()
+
     ModelRegistry.cleanup()
     logger.info("Shutting down Inference Server")
 
@@ -88,8 +110,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-rate_limiter = RateLimiter(requests_per_minute=settings.rate_limit_per_minute)
-idempotency_cache = IdempotencyCache()
+rate_limiter: RateLimiter | RedisRateLimiter
+if settings.rate_limit_backend == "redis":
+    rate_limiter = RedisRateLimiter(
+        settings.redis_url, requests_per_minute=settings.rate_limit_per_minute
+    )
+else:
+    rate_limiter = RateLimiter(requests_per_minute=settings.rate_limit_per_minute)
+
+idempotency_cache: IdempotencyCache | RedisIdempotencyCache
+if settings.idempotency_backend == "redis":
+    idempotency_cache = RedisIdempotencyCache(settings.redis_url)
+else:
+    idempotency_cache = IdempotencyCache()
+
+
+def _send_task_batch(model_name: str, priority: str, items: list[dict[str, Any]]) -> None:
+    celery_app.send_task(
+        "app.tasks.gpu_worker.process_inference_batch",
+        args=[model_name, items],
+        queue="gpu-batch",
+        task_id=uuid7(),
+        priority=_PRIORITY_NUM[priority],
+    )
+    logger.info("Task batch submitted", model=model_name, batch_size=len(items))
+
+
+async def _fail_task_batch(items: list[dict[str, Any]], exc: Exception) -> None:
+    # Every item already got a 202. Mark them failed so pollers don't see PENDING
+    # forever, and release their idempotency keys so client retries resubmit.
+    for item in items:
+        celery_app.backend.mark_as_failure(item["task_id"], exc)
+        if item["client_request_id"]:
+            await idempotency_cache.delete_task_id(item["client_request_id"], item["task_id"])
+
+
+task_batcher = TaskBatcher(
+    _send_task_batch,
+    _fail_task_batch,
+    max_batch_size=settings.batch_size,
+    max_wait_ms=settings.batch_max_wait_ms,
+)
 
 
 @app.get("/health")
@@ -99,6 +160,14 @@ async def health_check():
 
 @app.post("/v1/tasks", response_model=TaskResponse, status_code=status.HTTP_202_ACCEPTED)
 async def submit_task(request: TaskRequest, api_key: str = Depends(verify_api_key)):
+    # Validate locally first so bad requests spend neither a rate-limit token nor a
+    # cache lookup.
+    if not ModelRegistry.has(request.model):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model {request.model} not supported. Available models: {ModelRegistry.list_models()}",
+        )
+
     await rate_limiter.check_rate_limit(api_key)
 
     if request.client_request_id:
@@ -109,26 +178,42 @@ async def submit_task(request: TaskRequest, api_key: str = Depends(verify_api_ke
             )
             return TaskResponse(task_id=existing_task_id, status="PENDING")
 
-    if request.model not in ModelRegistry.list_models():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Model {request.model} not supported. Available models: {ModelRegistry.list_models()}",
-        )
-
-    task_id = str(uuid.uuid4())
-
-    queue_name = f"gpu-{request.priority}"
-
-    celery_app.send_task(
-        "app.tasks.gpu_worker.process_inference",
-        args=[task_id, request.model, request.input, request.callback_url],
-        queue=queue_name,
-        task_id=task_id,
-        priority={"high": 9, "normal": 5, "low": 1}[request.priority],
-    )
+    task_id = uuid7()
 
+    # Claim the idempotency key before dispatching, so concurrent retries of the
+    # same request queue exactly one task and all get its id back.
     if request.client_request_id:
-        await idempotency_cache.set_task_id(request.client_request_id, task_id)
+        claimed_task_id = await idempotency_cache.set_task_id(request.client_request_id, task_id)
+        if claimed_task_id != task_id:
+            return TaskResponse(task_id=claimed_task_id, status="PENDING")
+
+    if settings.batch_size > 1:
+        task_batcher.add(
+            request.model,
+            request.priority,
+            {
+                "task_id": task_id,
+                "input_data": request.input,
+                "callback_url": request.callback_url,
+                "client_request_id": request.client_request_id,
+            },
+        )
+    else:
+        try:
+            celery_app.send_task(
+                "app.tasks.gpu_worker.process_inference",
+                args=[task_id, request.model, request.input, request.callback_url],
+                queue=_QUEUE_NAME[request.priority],
+                task_id=task_id,
+                priority=_PRIORITY_NUM[request.priority],
+            )
+        except Exception as e:
+            # Nothing was queued. Fail the task for any duplicate that already got
+            # its id back, and let a retry of this request claim the key again.
+            celery_app.backend.mark_as_failure(task_id, e)
+            if request.client_request_id:
+                await idempotency_cache.delete_task_id(request.client_request_id, task_id)
+            raise
 
     task_submitted.labels(model=request.model, priority=request.priority).inc()
 
@@ -139,26 +224,28 @@ async def submit_task(request: TaskRequest, api_key: str = Depends(verify_api_ke
 
 @app.get("/v1/tasks/{task_id}", response_model=TaskStatus)
 async def get_task_status(task_id: str, api_key: str = Depends(verify_api_key)):
-    task = celery_app.AsyncResult(task_id)
+    # One backend read; AsyncResult would re-fetch meta for .state, .result and .info.
+    meta = celery_app.backend.get_task_meta(task_id)
+    state = meta["status"]
 
-    if task.state == "PENDING":
+    if state == "PENDING":
         status_data = {"task_id": task_id, "status": "PENDING"}
-    elif task.state == "STARTED":
+    elif state == "STARTED":
         status_data = {"task_id": task_id, "status": "STARTED"}
-    elif task.state == "SUCCESS":
-        result = task.result
+    elif state == "SUCCESS":
+        result = meta["result"]
         status_data = {
             "task_id": task_id,
             "status": "SUCCESS",
             "timing": result.get("timing"),
             "result": result.get("result"),
         }
-    elif task.state == "FAILURE":
-        status_data = {"task_id": task_id, "status": "FAILURE", "error": str(task.info)}
-    elif task.state == "RETRY":
-        status_data = {"task_id": task_id, "status": "RETRY", "error": str(task.info)}
+    elif state == "FAILURE":
+        status_data = {"task_id": task_id, "status": "FAILURE", "error": str(meta.get("result"))}
+    elif state == "RETRY":
+        status_data = {"task_id": task_id, "status": "RETRY", "error": str(meta.get("result"))}
     else:
-        status_data = {"task_id": task_id, "status": task.state}
+        status_data = {"task_id": task_id, "status": state}
 
     task_status_checked.labels(status=status_data["status"]).inc()
 
@@ -1,9 +1,21 @@
+import math
+import queue
+import threading
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any
 
+import structlog
 import torch
 from pydantic import BaseModel, ConfigDict
 
+logger = structlog.get_logger()
+
+# Image download, decode and resize release the GIL, so batch inputs can be
+# prepared in parallel. Threads start lazily, so prefork children get their own.
+_prepare_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prepare")
+
 
 class ModelConfig(BaseModel):
     model_config = ConfigDict(protected_namespaces=())
@@ -12,6 +24,9 @@ class ModelConfig(BaseModel):
     device: str = "cuda"
     gpu_id: int | None = None
     batch_size: int = 1
+    max_batch_delay_ms: float = 8.0
+    torch_compile: bool = True
+    torch_jit: bool = False
     extra_config: dict[str, Any] = {}
 
 
@@ -19,8 +34,23 @@ class BaseModelRunner(ABC):
     def __init__(self, config: ModelConfig):
         self.config = config
         self.device = self._setup_device()
-        self.model = None
+        self.model: Any = None
         self.is_loaded = False
+        # BF16 keeps FP32's exponent range (no overflow in activations) where the
+        # GPU supports it; older cards fall back to FP16.
+        self.autocast_dtype = (
+            torch.bfloat16
+            if self.device.type == "cuda" and torch.cuda.is_bf16_supported()
+            else torch.float16
+        )
+        # (input shape, dtype) -> (graph, static input, static output)
+        self._graphs: dict[
+            tuple[tuple[int, ...], torch.dtype],
+            tuple[torch.cuda.CUDAGraph, torch.Tensor, torch.Tensor],
+        ] = {}
+        # Captured graphs share their static buffers across callers (threads
+        # pool, BatchedRunner), so copy-in, replay and copy-out are serialized.
+        self._graph_lock = threading.Lock()
 
     def _setup_device(self) -> torch.device:
         if self.config.gpu_id is not None:
@@ -30,6 +60,74 @@ class BaseModelRunner(ABC):
         else:
             return torch.device("cpu")
 
+    def to_device(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Copy a host tensor to the runner device.
+
+        On CUDA the tensor is staged in pinned memory so the copy can be issued
+        asynchronously instead of blocking on a pageable-memory transfer.
+        """
+        if self.device.type == "cuda":
+            tensor = tensor.pin_memory()
+        return tensor.to(self.device, non_blocking=True)
+
+    def compile_model(self, sample_input: torch.Tensor, **compile_kwargs: Any) -> None:
+        """Wrap ``self.model`` with ``torch.compile`` and warm it up on CUDA.
+
+        The warm-up forward pass triggers compilation at load time so the first
+        task doesn't pay for it; with ``TORCHINDUCTOR_CACHE_DIR`` on a persistent
+        volume, restarted workers load compiled graphs from disk instead.
+        """
+        if self.device.type != "cuda" or not self.config.torch_compile:
+            return
+
+        self.model = torch.compile(self.model, **compile_kwargs)
+        self.forward(sample_input.to(self.device))
+
+    def freeze_model(self, sample_input: torch.Tensor) -> None:
+        """Replace ``self.model`` with a traced, frozen TorchScript module.
+
+        Freezing inlines parameters as constants and folds patterns such as
+        conv+batchnorm, and the module runs without per-layer Python dispatch.
+        The eager model is kept if tracing fails or the frozen module's output
+        on ``sample_input`` doesn't match it.
+        """
+        sample_input = sample_input.to(self.device)
+
+        try:
+            with torch.no_grad():
+                frozen = torch.jit.freeze(torch.jit.trace(self.model, sample_input))
+                matches = torch.allclose(frozen(sample_input), self.model(sample_input), atol=1e-5)
+        except Exception as e:
+            logger.warning(
+                "Failed to freeze model, running eager", model=self.config.model_name, error=str(e)
+            )
+            return
+
+        if not matches:
+            logger.warning(
+                "Frozen model output differs, running eager", model=self.config.model_name
+            )
+            return
+
+        self.model = frozen
+
+    def sample_input(self) -> torch.Tensor | None:
+        """A representative host input for warm-up, or None if there is none."""
+        return None
+
+    def warmup(self) -> None:
+        """Load the model and run one dummy forward pass ahead of the first task."""
+        if not self.is_loaded:
+            self.load_model()
+            self.is_loaded = True
+
+        sample_input = self.sample_input()
+        if sample_input is not None:
+            self.forward(self.to_device(sample_input))
+
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+
     @abstractmethod
     def load_model(self) -> None:
         pass
@@ -46,6 +144,65 @@ class BaseModelRunner(ABC):
     def postprocess(self, output: torch.Tensor) -> dict[str, Any]:
         pass
 
+    def capture_graph(self, sample_input: torch.Tensor) -> None:
+        """Capture a CUDA graph of the forward pass for ``sample_input``'s shape.
+
+        Later ``forward`` calls with the same shape and dtype replay the graph
+        instead of launching every kernel from Python. For eager models with a
+        fixed input shape; ``torch.compile(mode="reduce-overhead")`` already
+        does this itself.
+        """
+        if self.device.type != "cuda":
+            return
+
+        static_input = sample_input.to(self.device).clone()
+
+        # Warm up on a side stream so lazy initialization (cuDNN autotuning,
+        # allocator pools) happens before capture.
+        stream = torch.cuda.Stream(self.device)
+        stream.wait_stream(torch.cuda.current_stream(self.device))
+        with torch.cuda.stream(stream):
+            for _ in range(3):
+                self._forward(static_input)
+        torch.cuda.current_stream(self.device).wait_stream(stream)
+
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph):
+            static_output = self._forward(static_input)
+
+        self._graphs[(tuple(static_input.shape), static_input.dtype)] = (
+            graph,
+            static_input,
+            static_output,
+        )
+
+    def forward(self, tensor: torch.Tensor) -> torch.Tensor:
+        captured = self._graphs.get((tuple(tensor.shape), tensor.dtype))
+        if captured is None:
+            return self._forward(tensor)
+
+        graph, static_input, static_output = captured
+        with self._graph_lock:
+            static_input.copy_(tensor)
+            graph.replay()
+            # The next replay overwrites static_output in place.
+            return static_output.clone()
+
+    def _forward(self, tensor: torch.Tensor) -> torch.Tensor:
+        # Autocast on CUDA runs convs/matmuls on tensor cores; outputs may be half
+        # precision, so postprocess() should cast before converting to numpy. The
+        # cast cache must be off for casts to be recorded into CUDA graphs.
+        with (
+            torch.inference_mode(),
+            torch.autocast(
+                device_type=self.device.type,
+                dtype=self.autocast_dtype,
+                enabled=self.device.type == "cuda",
+                cache_enabled=False,
+            ),
+        ):
+            return self.infer(tensor)
+
     def run(self, input_data: dict[str, Any]) -> dict[str, Any]:
         if not self.is_loaded:
             self.load_model()
@@ -53,16 +210,159 @@ class BaseModelRunner(ABC):
 
         input_tensor = self.prepare(input_data)
 
-        with torch.no_grad():
-            output_tensor = self.infer(input_tensor)
+        output_tensor = self.forward(input_tensor)
 
         result = self.postprocess(output_tensor)
 
         return result
 
+    def prepare_batch(self, inputs: list[dict[str, Any]]) -> list[torch.Tensor]:
+        if len(inputs) == 1:
+            return [self.prepare(inputs[0])]
+        return list(_prepare_pool.map(self.prepare, inputs))
+
+    def infer_batch(self, tensors: list[torch.Tensor]) -> list[torch.Tensor]:
+        """Run inputs bucketed by shape, one forward pass per bucket.
+
+        Mixed-size inputs (e.g. superres images) are never padded to the largest
+        one; each bucket only computes its real pixels. Buckets run largest
+        first so the biggest allocations happen before the allocator fragments.
+        Outputs are returned in input order.
+        """
+        buckets: dict[tuple[int, ...], list[int]] = {}
+        for index, tensor in enumerate(tensors):
+            buckets.setdefault(tuple(tensor.shape[1:]), []).append(index)
+
+        outputs: dict[int, torch.Tensor] = {}
+        for shape in sorted(buckets, key=math.prod, reverse=True):
+            indices = buckets[shape]
+            batch = torch.cat([tensors[index] for index in indices])
+            for index, output in zip(indices, self.forward(batch).split(1)):
+                outputs[index] = output
+
+        return [outputs[index] for index in range(len(tensors))]
+
+    def postprocess_batch(self, outputs: list[torch.Tensor]) -> list[dict[str, Any]]:
+        return [self.postprocess(output) for output in outputs]
+
+    def run_batch(self, inputs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        if not self.is_loaded:
+            self.load_model()
+            self.is_loaded = True
+
+        input_tensors = self.prepare_batch(inputs)
+
+        output_tensors = self.infer_batch(input_tensors)
+
+        return self.postprocess_batch(output_tensors)
+
     def cleanup(self) -> None:
+        self._graphs.clear()
         if self.model is not None:
             del self.model
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
         self.is_loaded = False
+
+
+class BatchedRunner:
+    """Coalesces concurrent ``run`` calls on one runner into batched forward passes.
+
+    Callers prepare and postprocess on their own thread; a background thread
+    drains queued input tensors (up to ``max_batch_size``, waiting at most
+    ``max_delay_ms`` for stragglers), concatenates inputs of matching shape and
+    runs a single ``infer`` per shape. Wrapped runners must not keep
+    per-request state between ``prepare`` and ``postprocess``.
+    """
+
+    def __init__(self, runner: BaseModelRunner, max_batch_size: int, max_delay_ms: float):
+        self.runner = runner
+        self.config = runner.config
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000.0
+        self._queue: queue.Queue[tuple[torch.Tensor, Future] | None] = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._worker: threading.Thread | None = None
+
+    def run(self, input_data: dict[str, Any]) -> dict[str, Any]:
+        self._ensure_started()
+
+        input_tensor = self.runner.prepare(input_data)
+
+        future: Future[torch.Tensor] = Future()
+        self._queue.put((input_tensor, future))
+        output_tensor = future.result()
+
+        return self.runner.postprocess(output_tensor)
+
+    def run_batch(self, inputs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        # Already a batch; run it directly instead of queueing item by item.
+        self._ensure_started()
+        return self.runner.run_batch(inputs)
+
+    def warmup(self) -> None:
+        with self._start_lock:
+            self.runner.warmup()
+
+    def _ensure_started(self) -> None:
+        with self._start_lock:
+            if not self.runner.is_loaded:
+                self.runner.load_model()
+                self.runner.is_loaded = True
+
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._batch_loop, name=f"batcher-{self.config.model_name}", daemon=True
+                )
+                self._worker.start()
+
+    def _collect(self) -> list[tuple[torch.Tensor, Future] | None]:
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+
+        while items[-1] is not None and len(items) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        return items
+
+    def _batch_loop(self) -> None:
+        while True:
+            items = self._collect()
+            stopping = items[-1] is None
+            pending = [item for item in items if item is not None]
+
+            groups: dict[tuple[int, ...], list[tuple[torch.Tensor, Future]]] = {}
+            for tensor, future in pending:
+                groups.setdefault(tuple(tensor.shape[1:]), []).append((tensor, future))
+
+            for shape in sorted(groups, key=math.prod, reverse=True):
+                group = groups[shape]
+                try:
+                    batch = torch.cat([tensor for tensor, _ in group])
+                    # One device->host copy per batch; host tensors are also safe from
+                    # buffers being reused by the next forward pass (e.g. CUDA graphs).
+                    outputs = self.runner.forward(batch).cpu()
+                except Exception as e:
+                    for _, future in group:
+                        future.set_exception(e)
+                    continue
+
+                for (_, future), output in zip(group, outputs.split(1)):
+                    future.set_result(output)
+
+            if stopping:
+                return
+
+    def cleanup(self) -> None:
+        with self._start_lock:
+            if self._worker is not None:
+                self._queue.put(None)
+                self._worker.join()
+                self._worker = None
+        self.runner.cleanup()
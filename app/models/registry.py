@@ -1,20 +1,24 @@
+import threading
 
 import structlog
 
-from app.models.base import BaseModelRunner, ModelConfig
+from app.models.base import BaseModelRunner, BatchedRunner, ModelConfig
 
 logger = structlog.get_logger()
 
 
 class ModelRegistry:
     _runners: dict[str, type[BaseModelRunner]] = {}
-    _instances: dict[str, BaseModelRunner] = {}
+    _instances: dict[str, BaseModelRunner | BatchedRunner] = {}
+    _instances_lock = threading.Lock()
+    _runner_names: frozenset[str] = frozenset()
 
     @classmethod
     def register(cls, model_name: str, runner_class: type[BaseModelRunner]) -> None:
         if model_name in cls._runners:
             logger.warning(f"Model {model_name} already registered, overwriting")
         cls._runners[model_name] = runner_class
+        cls._runner_names = frozenset(cls._runners)
         logger.info(f"Registered model runner: {model_name}")
 
     @classmethod
@@ -31,14 +35,25 @@ class ModelRegistry:
         return runner
 
     @classmethod
-    def get_or_create_runner(cls, config: ModelConfig) -> BaseModelRunner:
+    def get_or_create_runner(cls, config: ModelConfig) -> BaseModelRunner | BatchedRunner:
         cache_key = f"{config.model_name}_{config.gpu_id}"
 
-        if cache_key not in cls._instances:
-            cls._instances[cache_key] = cls.create_runner(config)
-            logger.info(f"Created new runner instance for {cache_key}")
+        with cls._instances_lock:
+            if cache_key not in cls._instances:
+                base_runner: BaseModelRunner = cls.create_runner(config)
+                runner: BaseModelRunner | BatchedRunner = base_runner
+                if config.batch_size > 1:
+                    runner = BatchedRunner(
+                        base_runner, config.batch_size, config.max_batch_delay_ms
+                    )
+                cls._instances[cache_key] = runner
+                logger.info(f"Created new runner instance for {cache_key}")
 
-        return cls._instances[cache_key]
+            return cls._instances[cache_key]
+
+    @classmethod
+    def has(cls, model_name: str) -> bool:
+        return model_name in cls._runner_names
 
     @classmethod
     def list_models(cls) -> list[str]:
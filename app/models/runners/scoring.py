@@ -1,7 +1,6 @@
 import base64
 import io
 import random
-import time
 from typing import Any
 
 import httpx
@@ -9,6 +8,7 @@ import numpy as np
 import structlog
 import torch
 from PIL import Image
+from torchvision.transforms.functional import pil_to_tensor
 
 from app.models.base import BaseModelRunner
 from app.models.registry import model_runner
@@ -20,7 +20,6 @@ logger = structlog.get_logger()
 class ImageScoringRunner(BaseModelRunner):
     def load_model(self) -> None:
         logger.info(f"Loading ImageScoring model on {self.device}")
-        time.sleep(1.5)
 
         self.model = torch.nn.Sequential(
             torch.nn.Conv2d(3, 32, 3, stride=2, padding=1),
@@ -31,9 +30,23 @@ class ImageScoringRunner(BaseModelRunner):
             torch.nn.Flatten(),
             torch.nn.Linear(64, 5),
         ).to(self.device)
+        self.model.eval()
+
+        # Input is always 1x3x224x224, so CUDA graphs can be captured up front.
+        sample_input = self.sample_input()
+        if self.config.torch_jit:
+            self.freeze_model(sample_input)
+            self.capture_graph(sample_input)
+        elif self.config.torch_compile:
+            self.compile_model(sample_input, mode="reduce-overhead", fullgraph=True)
+        else:
+            self.capture_graph(sample_input)
 
         logger.info("ImageScoring model loaded successfully")
 
+    def sample_input(self) -> torch.Tensor:
+        return torch.zeros(1, 3, 224, 224)
+
     def prepare(self, input_data: dict[str, Any]) -> torch.Tensor:
         if "image_url" in input_data:
             response = httpx.get(input_data["image_url"], timeout=30)
@@ -48,22 +61,13 @@ class ImageScoringRunner(BaseModelRunner):
 
         image = image.resize((224, 224), Image.Resampling.LANCZOS)
 
-        self.image_metadata = {
-            "original_size": image.size,
-            "format": image.format or "UNKNOWN",
-            "mode": image.mode,
-        }
+        # Move uint8 pixels to the device and convert there: 4x fewer bytes to copy
+        # and no intermediate float32 ndarray on the host.
+        image_tensor = pil_to_tensor(image).unsqueeze(0)
 
-        image_array = np.array(image).astype(np.float32) / 255.0
-        image_tensor = torch.from_numpy(image_array).permute(2, 0, 1).unsqueeze(0)
-
-        return image_tensor.to(self.device)
+        return self.to_device(image_tensor).float().div_(255.0)
 
     def infer(self, tensor: torch.Tensor) -> torch.Tensor:
-        inference_time = random.uniform(0.3, 0.8)
-        logger.info(f"Running ImageScoring inference for {inference_time:.2f}s")
-        time.sleep(inference_time)
-
         scores = self.model(tensor)
 
         scores = torch.sigmoid(scores)
@@ -71,7 +75,7 @@ class ImageScoringRunner(BaseModelRunner):
         return scores
 
     def postprocess(self, output: torch.Tensor) -> dict[str, Any]:
-        scores = output.squeeze(0).cpu().numpy()
+        scores = output.squeeze(0).float().cpu().numpy()
 
         score_labels = ["quality", "aesthetics", "sharpness", "color_balance", "composition"]
 
@@ -97,6 +101,9 @@ class ImageScoringRunner(BaseModelRunner):
             "scores": scores_dict,
             "overall_score": overall_score,
             "quality_assessment": quality_assessment,
-            "metadata": self.image_metadata,
+            # Built here instead of being stashed on the runner in prepare(): batched
+            # and concurrent calls share one runner. It describes the prepared input,
+            # which is always the resized 224x224 RGB image.
+            "metadata": {"original_size": [224, 224], "format": "UNKNOWN", "mode": "RGB"},
             "confidence": random.uniform(0.85, 0.99),
         }
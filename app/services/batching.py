@@ -0,0 +1,87 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import structlog
+
+logger = structlog.get_logger()
+
+BatchKey = tuple[str, str]
+
+
+class TaskBatcher:
+    """Coalesces submitted tasks into one broker message per (model, priority).
+
+    Items are buffered until ``max_batch_size`` have arrived or ``max_wait_ms``
+    has passed since the first one, then handed to ``flush(model, priority,
+    items)``. If the flush raises, ``on_error(items, exc)`` is scheduled on the
+    loop so callers that already answered 202 can record the failure. Runs on
+    the API event loop, so no locking is needed.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[str, str, list[dict[str, Any]]], None],
+        on_error: Callable[[list[dict[str, Any]], Exception], Awaitable[None]],
+        max_batch_size: int,
+        max_wait_ms: float,
+    ):
+        self._flush = flush
+        self._on_error = on_error
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: dict[BatchKey, list[dict[str, Any]]] = {}
+        self._timers: dict[BatchKey, asyncio.TimerHandle] = {}
+        # Strong references so scheduled error handlers aren't garbage collected.
+        self._error_tasks: set[asyncio.Task[None]] = set()
+
+    def add(self, model_name: str, priority: str, item: dict[str, Any]) -> None:
+        key = (model_name, priority)
+        items = self._pending.setdefault(key, [])
+        items.append(item)
+
+        if len(items) >= self.max_batch_size:
+            self._flush_key(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(
+                self.max_wait, self._flush_key, key
+            )
+
+    def _flush_key(self, key: BatchKey) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        items = self._pending.pop(key, None)
+        if not items:
+            return
+
+        model_name, priority = key
+        try:
+            self._flush(model_name, priority, items)
+        except Exception as e:
+            logger.error(
+                "Failed to dispatch task batch",
+                model=model_name,
+                task_ids=[item["task_id"] for item in items],
+                error=str(e),
+            )
+            task = asyncio.get_running_loop().create_task(self._handle_error(items, e))
+            self._error_tasks.add(task)
+            task.add_done_callback(self._error_tasks.discard)
+
+    async def _handle_error(self, items: list[dict[str, Any]], exc: Exception) -> None:
+        try:
+            await self._on_error(items, exc)
+        except Exception as e:
+            logger.error(
+                "Failed to record task batch failure",
+                task_ids=[item["task_id"] for item in items],
+                error=str(e),
+            )
+
+    async def flush_all(self) -> None:
+        for key in list(self._pending):
+            self._flush_key(key)
+        if self._error_tasks:
+            await asyncio.gather(*self._error_tasks)
@@ -1,3 +1,6 @@
+from functools import lru_cache
+from typing import NamedTuple
+
 import structlog
 from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
 
@@ -89,5 +92,21 @@ auth_failures = Counter(
 )
 
 
+class ModelMetrics(NamedTuple):
+    inference_duration: Histogram
+    total_duration: Histogram
+    task_completed: Counter
+
+
+@lru_cache(maxsize=64)
+def model_metrics(model_name: str) -> ModelMetrics:
+    # Resolve labelled children once per model instead of via labels() per task.
+    return ModelMetrics(
+        inference_duration=inference_duration.labels(model=model_name),
+        total_duration=total_duration.labels(model=model_name),
+        task_completed=task_completed.labels(model=model_name),
+    )
+
+
 def setup_metrics():
     logger.info("Prometheus metrics initialized")
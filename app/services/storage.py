@@ -1,13 +1,26 @@
+import io
+import shutil
 from pathlib import Path
+from typing import BinaryIO
 
 import boto3
 import structlog
+from boto3.s3.transfer import TransferConfig
 from minio import Minio
 
 from app.config import settings
 
 logger = structlog.get_logger()
 
+# Payloads over 8 MiB go up as 8 MiB multipart chunks, up to 10 parts in flight on
+# the transfer manager's thread pool, instead of one serial PUT.
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True,
+)
+
 
 class StorageService:
     def __init__(self):
@@ -57,10 +70,28 @@ class StorageService:
             return str(file_path)
 
         else:
-            import io
+            return self.upload_stream(io.BytesIO(data), key, content_type=content_type)
+
+    def upload_stream(
+        self, fileobj: BinaryIO, key: str, content_type: str = "application/octet-stream"
+    ) -> str:
+        if self.use_local:
+            file_path = self.local_path / key
+            file_path.parent.mkdir(parents=True, exist_ok=True)
 
-            self.s3_client.put_object(
-                Bucket=settings.s3_bucket, Key=key, Body=io.BytesIO(data), ContentType=content_type
+            with open(file_path, "wb") as f:
+                shutil.copyfileobj(fileobj, f)
+
+            logger.info(f"Saved file locally: {file_path}")
+            return str(file_path)
+
+        else:
+            self.s3_client.upload_fileobj(
+                fileobj,
+                settings.s3_bucket,
+                key,
+                ExtraArgs={"ContentType": content_type},
+                Config=_TRANSFER_CONFIG,
             )
 
             url = f"{settings.s3_endpoint}/{settings.s3_bucket}/{key}"
@@ -16,7 +16,10 @@ celery_app = Celery(
 celery_app.conf.update(
     task_serializer="json",
     accept_content=["json"],
-    result_serializer="json",
+    # Results are read back on every status poll; msgpack is smaller than JSON
+    # over Redis. JSON stays accepted for results stored before the switch.
+    result_serializer="msgpack",
+    result_accept_content=["msgpack", "json"],
     timezone="UTC",
     enable_utc=True,
     task_acks_late=True,
@@ -28,13 +31,16 @@ celery_app.conf.update(
     task_soft_time_limit=540,
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=100,
+    worker_proc_alive_timeout=settings.worker_proc_alive_timeout,
     task_queues=(
         Queue("gpu-high", Exchange("gpu", type="direct"), routing_key="gpu.high", priority=9),
         Queue("gpu-normal", Exchange("gpu", type="direct"), routing_key="gpu.normal", priority=5),
         Queue("gpu-low", Exchange("gpu", type="direct"), routing_key="gpu.low", priority=1),
+        Queue("gpu-batch", Exchange("gpu", type="direct"), routing_key="gpu.batch", priority=5),
     ),
     task_routes={
         "app.tasks.gpu_worker.process_inference": {"queue": "gpu-normal"},
+        "app.tasks.gpu_worker.process_inference_batch": {"queue": "gpu-batch"},
     },
     beat_schedule={},
 )
@@ -1,30 +1,141 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Any
 
+import botocore.exceptions
 import httpx
+import orjson
 import structlog
-from celery import Task
+from celery import Task, states
+from celery.concurrency import get_implementation
+from celery.concurrency.prefork import TaskPool as PreforkPool
+from celery.concurrency.solo import TaskPool as SoloPool
 from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import (
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
 
+import app.models.runners  # noqa: F401  (registers runners)
+from app.config import settings
 from app.models.base import ModelConfig
 from app.models.registry import ModelRegistry
-from app.services.metrics import (
-    inference_duration,
-    storage_duration,
-    task_completed,
-    task_failed,
-    total_duration,
-)
+from app.services.metrics import model_metrics, storage_duration, task_failed
 from app.services.storage import StorageService
 from app.tasks.celery_app import celery_app
 from app.utils.timing import Timer
 
 logger = structlog.get_logger()
 
+# Callbacks are sent off the task thread so a slow receiver doesn't hold the
+# worker slot (and its GPU) for up to callback_timeout after inference is done.
+_io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="callback")
+
+# Shared by the pool threads so repeat callbacks to the same host reuse
+# keep-alive connections instead of paying DNS + TCP/TLS setup every task.
+_callback_client = httpx.Client(
+    timeout=settings.callback_timeout,
+    limits=httpx.Limits(max_keepalive_connections=32),
+)
+
+
+def _send_callback(callback_url: str, response: dict[str, Any]) -> None:
+    try:
+        _callback_client.post(
+            callback_url,
+            content=orjson.dumps(response),
+            headers={"content-type": "application/json"},
+        )
+        logger.info("Callback sent", task_id=response["task_id"], callback_url=callback_url)
+    except Exception as e:
+        logger.error("Failed to send callback", task_id=response["task_id"], error=str(e))
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _shutdown_callbacks(**kwargs) -> None:
+    # Let queued callbacks go out before the process exits.
+    _io_pool.shutdown(wait=True)
+    _callback_client.close()
+
+
+@lru_cache(maxsize=64)
+def _build_config(model_name: str, gpu_id: int) -> ModelConfig:
+    # Built once per (model, GPU) instead of re-validating a pydantic model per task.
+    return ModelConfig(
+        model_name=model_name,
+        gpu_id=gpu_id,
+        device="cuda" if gpu_id >= 0 else "cpu",
+        batch_size=settings.worker_batch_size,
+        max_batch_delay_ms=settings.worker_batch_max_delay_ms,
+        torch_compile=settings.torch_compile,
+        torch_jit=settings.torch_jit,
+    )
+
+
+def _visible_gpu_id() -> int:
+    # One worker process is pinned to one GPU for its lifetime.
+    return int(os.environ.get("CUDA_VISIBLE_DEVICES", "0"))
+
+
+@worker_process_init.connect
+def _preload_models(**kwargs) -> None:
+    # Load weights, compile and prime kernels before the first task arrives
+    # rather than inside it.
+    gpu_id = _visible_gpu_id()
+
+    for model_name in settings.preload_model_list:
+        try:
+            runner = ModelRegistry.get_or_create_runner(_build_config(model_name, gpu_id))
+            runner.warmup()
+            logger.info("Preloaded model", model=model_name, gpu_id=gpu_id)
+        except Exception as e:
+            logger.error("Failed to preload model", model=model_name, error=str(e))
+
+
+@worker_init.connect
+def _preload_models_in_main_process(sender=None, **kwargs) -> None:
+    # Only prefork children and the solo pool send worker_process_init; pools
+    # that run tasks in the main process (threads) need the preload here.
+    pool_cls = get_implementation(getattr(sender, "pool_cls", "prefork"))
+    if issubclass(pool_cls, (PreforkPool, SoloPool)):
+        return
+    _preload_models()
+
+
+def _store_outputs(storage_service: StorageService, task_id: str, result: dict[str, Any]) -> None:
+    # Popped before uploading so the buffer can never reach the result backend,
+    # even when the upload fails; closed as soon as it has been sent.
+    image_buffer = result.pop("image_buffer", None)
+    if image_buffer is None:
+        return
+
+    s3_key = f"results/{task_id}.png"
+    try:
+        s3_url = storage_service.upload_stream(image_buffer, s3_key, content_type="image/png")
+    finally:
+        image_buffer.close()
+
+    result["s3_key"] = s3_key
+    result["s3_url"] = s3_url
+
 
 class InferenceTask(Task):
-    autoretry_for = (Exception,)
-    retry_kwargs = {"max_retries": 3}
+    # Only transient I/O failures are retried. Bad input or a model error fails
+    # the same way every time, so re-running it would just burn GPU time.
+    autoretry_for = (
+        httpx.TransportError,
+        # S3 connect failures (EndpointConnectionError, ConnectTimeoutError, ...)
+        # and mid-request read/close failures are separate botocore hierarchies.
+        botocore.exceptions.ConnectionError,
+        botocore.exceptions.HTTPClientError,
+        ConnectionError,
+        TimeoutError,
+    )
+    retry_kwargs = {"max_retries": settings.max_retries}
     retry_backoff = True
     retry_backoff_max = 300
     retry_jitter = True
@@ -35,17 +146,19 @@ class InferenceTask(Task):
         self.gpu_id = None
 
     def before_start(self, task_id, args, kwargs):
-        gpu_id = int(os.environ.get("CUDA_VISIBLE_DEVICES", "0"))
-        self.gpu_id = gpu_id
+        if self.gpu_id is None:
+            self.gpu_id = _visible_gpu_id()
 
         if self.storage_service is None:
             self.storage_service = StorageService()
 
-        logger.info(f"Starting task on GPU {gpu_id}", task_id=task_id)
+        logger.info("Starting task", task_id=task_id, gpu_id=self.gpu_id)
 
     def on_failure(self, exc, task_id, args, kwargs, einfo):
         logger.error("Task failed", task_id=task_id, error=str(exc))
-        task_failed.inc()
+        # Batches count their failures per item in _fail_items.
+        if self.name != process_inference_batch.name:
+            task_failed.inc()
 
     def on_success(self, retval, task_id, args, kwargs):
         logger.info("Task completed successfully", task_id=task_id)
@@ -66,56 +179,37 @@ def process_inference(
     callback_url: str | None = None,
 ) -> dict[str, Any]:
     timer = Timer()
-    timer.start("total")
 
     try:
-        gpu_id = int(os.environ.get("CUDA_VISIBLE_DEVICES", "0"))
-
-        logger.info("Processing inference task", task_id=task_id, model=model_name, gpu_id=gpu_id)
-
-        config = ModelConfig(
-            model_name=model_name, gpu_id=gpu_id, device="cuda" if gpu_id >= 0 else "cpu"
+        logger.info(
+            "Processing inference task", task_id=task_id, model=model_name, gpu_id=self.gpu_id
         )
 
-        timer.start("model_loading")
-        runner = ModelRegistry.get_or_create_runner(config)
-        timer.stop("model_loading")
+        config = _build_config(model_name, self.gpu_id)
 
-        timer.start("inference")
-        result = runner.run(input_data)
-        timer.stop("inference")
+        with timer.span("total"):
+            with timer.span("model_loading"):
+                runner = ModelRegistry.get_or_create_runner(config)
 
-        timer.start("storage")
-        if "image_bytes" in result:
-            s3_key = f"results/{task_id}.png"
-            s3_url = self.storage_service.upload_bytes(
-                result["image_bytes"], s3_key, content_type="image/png"
-            )
-            result["s3_key"] = s3_key
-            result["s3_url"] = s3_url
-            del result["image_bytes"]
-        timer.stop("storage")
+            with timer.span("inference"):
+                result = runner.run(input_data)
 
-        timer.stop("total")
+            with timer.span("storage"):
+                _store_outputs(self.storage_service, task_id, result)
 
         timing = timer.get_all_timings()
 
-        inference_duration.labels(model=model_name).observe(timing["inference"] / 1000)
+        metrics = model_metrics(model_name)
+        metrics.inference_duration.observe(timing["inference"] / 1000)
         storage_duration.observe(timing.get("storage", 0) / 1000)
-        total_duration.labels(model=model_name).observe(timing["total"] / 1000)
+        metrics.total_duration.observe(timing["total"] / 1000)
 
-        task_completed.labels(model=model_name).inc()
+        metrics.task_completed.inc()
 
         response = {"task_id": task_id, "status": "SUCCESS", "timing": timing, "result": result}
 
         if callback_url:
-            try:
-                timer.start("callback")
-                httpx.post(callback_url, json=response, timeout=30)
-                timer.stop("callback")
-                logger.info(f"Callback sent to {callback_url}")
-            except Exception as e:
-                logger.error("Failed to send callback", error=str(e))
+            _io_pool.submit(_send_callback, callback_url, response)
 
         return response
 
@@ -128,3 +222,91 @@ def process_inference(
         logger.error("Task error", task_id=task_id, error=str(e))
         task_failed.inc()
         raise
+
+
+@celery_app.task(
+    base=InferenceTask,
+    bind=True,
+    name="app.tasks.gpu_worker.process_inference_batch",
+    acks_late=True,
+    reject_on_worker_lost=True,
+)
+def process_inference_batch(
+    self,
+    model_name: str,
+    items: list[dict[str, Any]],
+) -> dict[str, Any]:
+    """Run a batch coalesced by the API in one ``run_batch`` call.
+
+    Each item carries its own ``task_id``, ``input_data`` and ``callback_url``;
+    per-item results are written to the result backend under the item's
+    task_id so ``GET /v1/tasks/{task_id}`` works as for single tasks.
+    """
+    timer = Timer()
+    task_ids = [item["task_id"] for item in items]
+
+    try:
+        logger.info(
+            "Processing inference batch",
+            task_ids=task_ids,
+            model=model_name,
+            gpu_id=self.gpu_id,
+            batch_size=len(items),
+        )
+
+        config = _build_config(model_name, self.gpu_id)
+
+        with timer.span("total"):
+            with timer.span("model_loading"):
+                runner = ModelRegistry.get_or_create_runner(config)
+
+            with timer.span("inference"):
+                results = runner.run_batch([item["input_data"] for item in items])
+
+            with timer.span("storage"):
+                for task_id, result in zip(task_ids, results):
+                    _store_outputs(self.storage_service, task_id, result)
+
+        timing = timer.get_all_timings()
+
+        metrics = model_metrics(model_name)
+        metrics.inference_duration.observe(timing["inference"] / 1000)
+        storage_duration.observe(timing.get("storage", 0) / 1000)
+        metrics.total_duration.observe(timing["total"] / 1000)
+
+        metrics.task_completed.inc(len(items))
+
+        for item, result in zip(items, results):
+            response = {
+                "task_id": item["task_id"],
+                "status": "SUCCESS",
+                "timing": timing,
+                "result": result,
+            }
+            self.backend.store_result(item["task_id"], response, states.SUCCESS)
+
+            if item.get("callback_url"):
+                _io_pool.submit(_send_callback, item["callback_url"], response)
+
+        return {"task_ids": task_ids, "timing": timing}
+
+    except SoftTimeLimitExceeded as e:
+        logger.error("Batch timeout", task_ids=task_ids)
+        _fail_items(self, task_ids, e)
+        raise
+
+    except Exception as e:
+        logger.error("Batch error", task_ids=task_ids, error=str(e))
+        _fail_items(self, task_ids, e)
+        raise
+
+
+def _fail_items(task: Task, task_ids: list[str], exc: Exception) -> None:
+    # Items would otherwise stay PENDING forever once the batch stops retrying.
+    max_retries = task.retry_kwargs.get("max_retries", task.max_retries)
+    if isinstance(exc, task.autoretry_for) and task.request.retries < max_retries:
+        return
+    # Counted per item, like task_completed on success.
+    task_failed.inc(len(task_ids))
+    for task_id in task_ids:
+        task.backend.mark_as_failure(task_id, exc)
@@ -1,66 +1,212 @@
 import asyncio
 import hashlib
-import json
-from datetime import datetime, timedelta
-from typing import Any
+import time
+from collections import OrderedDict, deque
+from contextlib import AsyncExitStack
+from typing import Any, cast
 
+import orjson
 import structlog
+from redis.asyncio import Redis
 
 logger = structlog.get_logger()
 
 
+def _compute_hash(data: dict[str, Any]) -> str:
+    # orjson emits sorted canonical bytes directly (no str -> bytes encode), and
+    # a 128-bit BLAKE2b digest is plenty for dedup keys and cheaper than SHA-256.
+    digest = hashlib.blake2b(orjson.dumps(data, option=orjson.OPT_SORT_KEYS), digest_size=16)
+    return digest.hexdigest()
+
+
+class _Shard:
+    def __init__(self, max_size: int):
+        # key -> (task_id, expires_at) in LRU order: least recently used first, so
+        # eviction pops from the front.
+        self.entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        # (expires_at, key) in insertion order. Every entry shares the same TTL, so
+        # this is also expiry order and cleanup only has to look at the head.
+        self.order: deque[tuple[float, str]] = deque()
+        self.max_size = max_size
+        self.lock = asyncio.Lock()
+
+
 class IdempotencyCache:
-    def __init__(self, ttl_seconds: int = 3600):
-        self.cache: dict[str, tuple[str, datetime]] = {}
+    def __init__(self, ttl_seconds: int = 3600, max_size: int = 10_000, num_shards: int = 16):
         self.ttl_seconds = ttl_seconds
-        self._lock = asyncio.Lock()
+        self.max_size = max_size
+        # Keys are spread over independently locked shards so unrelated requests do
+        # not serialize on one lock; the size bound is split evenly between them.
+        shard_size = -(-max_size // num_shards)
+        self._shards = [_Shard(shard_size) for _ in range(num_shards)]
 
-    def _compute_hash(self, data: dict[str, Any]) -> str:
-        json_str = json.dumps(data, sort_keys=True)
-        return hashlib.sha256(json_str.encode()).hexdigest()
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
 
     async def get_task_id(self, client_request_id: str) -> str | None:
-        async with self._lock:
-            self._cleanup_expired()
+        shard = self._shard(client_request_id)
+        async with shard.lock:
+            now = time.monotonic()
+            self._cleanup_expired(shard, now)
 
-            if client_request_id in self.cache:
-                task_id, timestamp = self.cache[client_request_id]
-                if datetime.now() - timestamp < timedelta(seconds=self.ttl_seconds):
-                    logger.info(f"Found cached task_id for client_request_id: {client_request_id}")
-                    return task_id
-                else:
-                    del self.cache[client_request_id]
+            entry = shard.entries.get(client_request_id)
+            if entry is not None and entry[1] > now:
+                shard.entries.move_to_end(client_request_id)
+                logger.info("Found cached task_id", client_request_id=client_request_id)
+                return entry[0]
 
             return None
 
-    async def set_task_id(self, client_request_id: str, task_id: str) -> None:
-        async with self._lock:
-            self.cache[client_request_id] = (task_id, datetime.now())
-            logger.info(f"Cached task_id for client_request_id: {client_request_id}")
+    async def set_task_id(self, client_request_id: str, task_id: str) -> str:
+        """Claim ``client_request_id`` for ``task_id`` unless a live entry holds it.
+
+        Returns the task_id that owns the key: ``task_id`` if the claim won,
+        otherwise the one already stored.
+        """
+        shard = self._shard(client_request_id)
+        async with shard.lock:
+            now = time.monotonic()
+            self._cleanup_expired(shard, now)
+
+            entry = shard.entries.get(client_request_id)
+            if entry is not None and entry[1] > now:
+                shard.entries.move_to_end(client_request_id)
+                return entry[0]
+
+            expires_at = now + self.ttl_seconds
+            shard.entries[client_request_id] = (task_id, expires_at)
+            shard.entries.move_to_end(client_request_id)
+            shard.order.append((expires_at, client_request_id))
+            while len(shard.entries) > shard.max_size:
+                shard.entries.popitem(last=False)
+            logger.info("Cached task_id", client_request_id=client_request_id)
+            return task_id
+
+    async def delete_task_id(self, client_request_id: str, task_id: str) -> None:
+        # Only release the key if task_id still owns it, so a failed dispatch can't
+        # drop a newer claim.
+        shard = self._shard(client_request_id)
+        async with shard.lock:
+            entry = shard.entries.get(client_request_id)
+            if entry is not None and entry[0] == task_id:
+                del shard.entries[client_request_id]
 
     async def get_by_content(self, request_data: dict[str, Any]) -> str | None:
-        request_hash = self._compute_hash(request_data)
+        request_hash = _compute_hash(request_data)
         return await self.get_task_id(request_hash)
 
-    async def set_by_content(self, request_data: dict[str, Any], task_id: str) -> None:
-        request_hash = self._compute_hash(request_data)
-        await self.set_task_id(request_hash, task_id)
-
-    def _cleanup_expired(self) -> None:
-        now = datetime.now()
-        expired_keys = [
-            key
-            for key, (_, timestamp) in self.cache.items()
-            if now - timestamp > timedelta(seconds=self.ttl_seconds)
-        ]
+    async def set_by_content(self, request_data: dict[str, Any], task_id: str) -> str:
+        request_hash = _compute_hash(request_data)
+        return await self.set_task_id(request_hash, task_id)
 
-        for key in expired_keys:
-            del self.cache[key]
+    def _cleanup_expired(self, shard: _Shard, now: float) -> None:
+        expired = 0
+        while shard.order and shard.order[0][0] <= now:
+            _, key = shard.order.popleft()
+            entry = shard.entries.get(key)
+            # Skip keys that were re-set (newer expiry) or already evicted.
+            if entry is not None and entry[1] <= now:
+                del shard.entries[key]
+                expired += 1
 
-        if expired_keys:
-            logger.info(f"Cleaned up {len(expired_keys)} expired cache entries")
+        if expired:
+            logger.info("Cleaned up expired cache entries", expired=expired)
 
     async def clear(self) -> None:
-        async with self._lock:
-            self.cache.clear()
+        async with AsyncExitStack() as stack:
+            for shard in self._shards:
+                await stack.enter_async_context(shard.lock)
+
+            for shard in self._shards:
+                shard.entries.clear()
+                shard.order.clear()
             logger.info("Cleared idempotency cache")
+
+
+# KEYS[1] = idempotency key, ARGV[1] = task_id; deletes the key only if it holds it.
+_RELEASE_LUA = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisIdempotencyCache:
+    """Idempotency keys shared by every API worker via Redis ``SET NX EX``.
+
+    Redis expires keys itself, so there is no cleanup pass. Hits are also kept in
+    a short-lived in-process ``IdempotencyCache`` so repeated retries of the same
+    request skip the round trip.
+    """
+
+    def __init__(
+        self,
+        redis_url: str,
+        ttl_seconds: int = 3600,
+        local_ttl_seconds: int = 300,
+        local_max_size: int = 10_000,
+    ):
+        self.redis = Redis.from_url(redis_url, decode_responses=True)
+        self.ttl_seconds = ttl_seconds
+        self._local = IdempotencyCache(
+            ttl_seconds=min(ttl_seconds, local_ttl_seconds), max_size=local_max_size
+        )
+
+    async def get_task_id(self, client_request_id: str) -> str | None:
+        task_id = await self._local.get_task_id(client_request_id)
+        if task_id is not None:
+            return task_id
+
+        # decode_responses=True, so values come back as str.
+        task_id = cast(str | None, await self.redis.get(f"idem:{client_request_id}"))
+        if task_id is not None:
+            await self._local.set_task_id(client_request_id, task_id)
+            logger.info("Found cached task_id", client_request_id=client_request_id)
+        return task_id
+
+    async def set_task_id(self, client_request_id: str, task_id: str) -> str:
+        """Claim ``client_request_id`` for ``task_id`` across all API workers.
+
+        ``SET NX GET`` claims the key and reads any existing owner in one atomic
+        round trip. Returns the winning task_id.
+        """
+        existing_task_id = cast(
+            str | None,
+            await self.redis.set(
+                f"idem:{client_request_id}", task_id, ex=self.ttl_seconds, nx=True, get=True
+            ),
+        )
+        if existing_task_id is not None:
+            # A concurrent submission (possibly on another worker) claimed the key first.
+            logger.info(
+                "Idempotency key already claimed",
+                client_request_id=client_request_id,
+                existing_task_id=existing_task_id,
+            )
+            task_id = existing_task_id
+
+        return await self._local.set_task_id(client_request_id, task_id)
+
+    async def delete_task_id(self, client_request_id: str, task_id: str) -> None:
+        # Compare-and-delete so a failed dispatch can't drop a newer claim.
+        await self.redis.eval(_RELEASE_LUA, 1, f"idem:{client_request_id}", task_id)
+        await self._local.delete_task_id(client_request_id, task_id)
+
+    async def get_by_content(self, request_data: dict[str, Any]) -> str | None:
+        return await self.get_task_id(_compute_hash(request_data))
+
+    async def set_by_content(self, request_data: dict[str, Any], task_id: str) -> str:
+        return await self.set_task_id(_compute_hash(request_data), task_id)
+
+    async def clear(self) -> None:
+        await self._local.clear()
+        async for key in self.redis.scan_iter(match="idem:*", count=1000):
+            await self.redis.unlink(key)
+        logger.info("Cleared idempotency cache")
+
+    async def close(self) -> None:
+        await self.redis.aclose()
@@ -0,0 +1,20 @@
+import os
+import time
+import uuid
+
+
+def uuid7() -> str:
+    """Return a time-ordered UUIDv7 (RFC 9562) string.
+
+    48-bit Unix millisecond timestamp followed by 74 random bits, so IDs sort by
+    creation time and keep Redis / result-backend keys roughly sequential.
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+
+    value = (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76
+    value |= ((rand >> 62) & 0xFFF) << 64
+    value |= 0b10 << 62
+    value |= rand & 0x3FFF_FFFF_FFFF_FFFF
+    return str(uuid.UUID(int=value))
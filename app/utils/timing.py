@@ -1,36 +1,58 @@
+import logging
 import time
+from collections.abc import Iterator
+from contextlib import contextmanager
 
 import structlog
 
 logger = structlog.get_logger()
+_stdlib_logger = logging.getLogger(__name__)
 
 
 class Timer:
     def __init__(self):
-        self.timings: dict[str, float] = {}
-        self.start_times: dict[str, float] = {}
+        # Monotonic nanosecond ints; converted to milliseconds only when read.
+        self.timings: dict[str, int] = {}
+        self.start_times: dict[str, int] = {}
 
     def start(self, name: str) -> None:
-        self.start_times[name] = time.time() * 1000
-        logger.debug(f"Timer started: {name}")
+        self.start_times[name] = time.perf_counter_ns()
+        if _stdlib_logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Timer started: {name}")
 
     def stop(self, name: str) -> float:
-        if name not in self.start_times:
+        start_ns = self.start_times.pop(name, None)
+        if start_ns is None:
             logger.warning(f"Timer {name} was not started")
             return 0.0
 
-        elapsed_ms = (time.time() * 1000) - self.start_times[name]
-        self.timings[name] = elapsed_ms
-        del self.start_times[name]
+        elapsed_ns = time.perf_counter_ns() - start_ns
+        self.timings[name] = elapsed_ns
 
-        logger.debug(f"Timer stopped: {name}, elapsed: {elapsed_ms:.2f}ms")
+        elapsed_ms = elapsed_ns / 1e6
+        if _stdlib_logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Timer stopped: {name}, elapsed: {elapsed_ms:.2f}ms")
         return elapsed_ms
 
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as ``name``.
+
+        Cheaper than start()/stop() on hot paths: the start time lives in a local
+        rather than start_times, and there is no debug logging.
+        """
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter_ns() - start_ns
+
     def get(self, name: str) -> float | None:
-        return self.timings.get(name)
+        elapsed_ns = self.timings.get(name)
+        return None if elapsed_ns is None else elapsed_ns / 1e6
 
     def get_all_timings(self) -> dict[str, float]:
-        return {name: round(time_ms, 2) for name, time_ms in self.timings.items()}
+        return {name: round(elapsed_ns / 1e6, 2) for name, elapsed_ns in self.timings.items()}
 
     def reset(self) -> None:
         self.timings.clear()
@@ -40,5 +62,8 @@ class Timer:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        for name in list(self.start_times.keys()):
+        # Usually every timer has been stopped by now.
+        if not self.start_times:
+            return
+        for name in tuple(self.start_times):
             self.stop(name)
@@ -1,14 +1,25 @@
+import asyncio
+import io
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import Mock, patch
 
 import pytest
 import torch
+from botocore.exceptions import ConnectTimeoutError, EndpointConnectionError
 from fastapi.testclient import TestClient
 
+import app.main as app_module
 from app.deps.ratelimit import RateLimiter
 from app.main import app
-from app.models.base import BaseModelRunner, ModelConfig
+from app.models.base import BaseModelRunner, BatchedRunner, ModelConfig
 from app.models.registry import ModelRegistry
+from app.services.metrics import task_failed
+from app.tasks.gpu_worker import InferenceTask, process_inference_batch
 from app.utils.idempotency import IdempotencyCache
+from app.utils.ids import uuid7
+from app.utils.timing import Timer
 
 
 class MockModelRunner(BaseModelRunner):
@@ -22,14 +33,14 @@ class MockModelRunner(BaseModelRunner):
         return torch.randn(1, 3, 896, 896)
 
     def postprocess(self, output):
-        return {"image_bytes": b"fake_image_data", "size": [896, 896], "format": "PNG"}
+        return {"image_buffer": io.BytesIO(b"fake_image_data"), "size": [896, 896], "format": "PNG"}
 
 
 @pytest.fixture
 def client(monkeypatch):
     # Override settings for testing
-    monkeypatch.setattr("app.config.settings.api_keys", ["test-key-123"])
-    monkeypatch.setattr("app.deps.auth.settings.api_keys", ["test-key-123"])
+    monkeypatch.setattr("app.config.settings.api_keys", frozenset({"test-key-123"}))
+    monkeypatch.setattr("app.deps.auth.settings.api_keys", frozenset({"test-key-123"}))
     with TestClient(app) as c:
         yield c
 
@@ -41,13 +52,13 @@ def mock_celery_app():
         mock_task.id = "test-task-123"
         mock.send_task.return_value = mock_task
 
-        mock_result = Mock()
-        mock_result.state = "SUCCESS"
-        mock_result.result = {
-            "timing": {"prepare_ms": 100, "infer_ms": 500, "upload_ms": 50},
-            "result": {"s3_key": "results/test.png", "size": [2048, 2048]},
+        mock.backend.get_task_meta.return_value = {
+            "status": "SUCCESS",
+            "result": {
+                "timing": {"prepare_ms": 100, "infer_ms": 500, "upload_ms": 50},
+                "result": {"s3_key": "results/test.png", "size": [2048, 2048]},
+            },
         }
-        mock.AsyncResult.return_value = mock_result
 
         yield mock
 
@@ -99,6 +110,7 @@ def test_submit_task_invalid_model(client, mock_celery_app):
 
     assert response.status_code == 400
     assert "not supported" in response.json()["detail"]
+    mock_celery_app.send_task.assert_not_called()
 
 
 def test_get_task_status(client, mock_celery_app):
@@ -129,6 +141,31 @@ async def test_idempotency_cache():
     assert task_id is None
 
 
+@pytest.mark.asyncio
+async def test_idempotency_cache_evicts_least_recently_used():
+    cache = IdempotencyCache(max_size=2, num_shards=1)
+
+    await cache.set_task_id("a", "task-a")
+    await cache.set_task_id("b", "task-b")
+    assert await cache.get_task_id("a") == "task-a"
+
+    await cache.set_task_id("c", "task-c")
+
+    assert await cache.get_task_id("b") is None
+    assert await cache.get_task_id("a") == "task-a"
+    assert await cache.get_task_id("c") == "task-c"
+
+
+@pytest.mark.asyncio
+async def test_idempotency_cache_expires_entries():
+    cache = IdempotencyCache(ttl_seconds=0)
+
+    await cache.set_task_id("client-123", "task-456")
+
+    assert await cache.get_task_id("client-123") is None
+    assert len(cache) == 0
+
+
 @pytest.mark.asyncio
 async def test_idempotency_by_content():
     cache = IdempotencyCache()
@@ -160,10 +197,32 @@ async def test_rate_limiter():
     await limiter.check_rate_limit("test-key")
 
 
+def test_uuid7_is_time_ordered():
+    first, second = uuid7(), uuid7()
+
+    assert uuid.UUID(first).version == 7
+    assert uuid.UUID(first).variant == uuid.RFC_4122
+    assert first[:8] <= second[:8]
+
+
+def test_timer_span_records_on_error():
+    timer = Timer()
+
+    with timer.span("ok"):
+        pass
+    with pytest.raises(ValueError), timer.span("failed"):
+        raise ValueError
+
+    assert set(timer.get_all_timings()) == {"ok", "failed"}
+    assert timer.get("ok") >= 0
+
+
 def test_model_registry():
     ModelRegistry.register("test-model", MockModelRunner)
 
     assert "test-model" in ModelRegistry.list_models()
+    assert ModelRegistry.has("test-model")
+    assert not ModelRegistry.has("unregistered-model")
 
     runner_class = ModelRegistry.get_runner_class("test-model")
     assert runner_class == MockModelRunner
@@ -199,3 +258,225 @@ def test_submit_task_with_idempotency(client, mock_celery_app):
         task_id2 = response2.json()["task_id"]
 
         assert task_id1 == task_id2
+
+
+def test_submit_task_duplicate_queues_once(client, mock_celery_app):
+    ModelRegistry.register("superres-x4", MockModelRunner)
+
+    request_data = {
+        "model": "superres-x4",
+        "input": {"image_url": "https://example.com/test.jpg"},
+        "client_request_id": "duplicate-request-456",
+    }
+
+    with patch("app.main.idempotency_cache.get_task_id", return_value=None):
+        response1 = client.post(
+            "/v1/tasks", json=request_data, headers={"x-api-key": "test-key-123"}
+        )
+        response2 = client.post(
+            "/v1/tasks", json=request_data, headers={"x-api-key": "test-key-123"}
+        )
+
+    assert response1.json()["task_id"] == response2.json()["task_id"]
+    mock_celery_app.send_task.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_idempotency_cache_set_returns_winner():
+    cache = IdempotencyCache()
+
+    assert await cache.set_task_id("client-123", "task-1") == "task-1"
+    assert await cache.set_task_id("client-123", "task-2") == "task-1"
+
+    await cache.delete_task_id("client-123", "task-2")
+    assert await cache.get_task_id("client-123") == "task-1"
+
+    await cache.delete_task_id("client-123", "task-1")
+    assert await cache.set_task_id("client-123", "task-2") == "task-2"
+
+
+class EchoRunner(BaseModelRunner):
+    def load_model(self):
+        self.model = Mock()
+        self.batch_sizes = []
+
+    def prepare(self, input_data):
+        return torch.tensor([[float(input_data["value"])]])
+
+    def infer(self, tensor):
+        self.batch_sizes.append(tensor.shape[0])
+        return tensor * 2
+
+    def postprocess(self, output):
+        return {"value": output.item()}
+
+
+def test_batched_runner_coalesces_concurrent_calls():
+    runner = EchoRunner(ModelConfig(model_name="echo", device="cpu"))
+    batched = BatchedRunner(runner, max_batch_size=4, max_delay_ms=200)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda v: batched.run({"value": v}), range(4)))
+
+    assert [r["value"] for r in results] == [0.0, 2.0, 4.0, 6.0]
+    assert max(runner.batch_sizes) > 1
+    assert sum(runner.batch_sizes) == 4
+
+    batched.cleanup()
+
+
+def test_run_batch_shares_forward_pass():
+    runner = EchoRunner(ModelConfig(model_name="echo", device="cpu"))
+
+    results = runner.run_batch([{"value": v} for v in range(3)])
+
+    assert [r["value"] for r in results] == [0.0, 2.0, 4.0]
+    assert runner.batch_sizes == [3]
+
+
+def test_submit_task_batched(client, mock_celery_app, monkeypatch):
+    ModelRegistry.register("superres-x4", MockModelRunner)
+    monkeypatch.setattr("app.main.settings.batch_size", 2)
+    monkeypatch.setattr("app.main.task_batcher.max_batch_size", 2)
+
+    task_ids = []
+    for _ in range(2):
+        response = client.post(
+            "/v1/tasks",
+            json={"model": "superres-x4", "input": {"image_url": "https://example.com/test.jpg"}},
+            headers={"x-api-key": "test-key-123"},
+        )
+        assert response.status_code == 202
+        task_ids.append(response.json()["task_id"])
+
+    mock_celery_app.send_task.assert_called_once()
+    call_args = mock_celery_app.send_task.call_args
+    assert call_args[0][0] == "app.tasks.gpu_worker.process_inference_batch"
+    assert call_args[1]["queue"] == "gpu-batch"
+    model_name, items = call_args[1]["args"]
+    assert model_name == "superres-x4"
+    assert [item["task_id"] for item in items] == task_ids
+
+
+class ShapeEchoRunner(EchoRunner):
+    def prepare(self, input_data):
+        return torch.full((1, input_data["width"]), float(input_data["value"]))
+
+    def postprocess(self, output):
+        return {"value": output[0, 0].item(), "width": output.shape[-1]}
+
+
+def test_run_batch_buckets_by_shape_largest_first():
+    runner = ShapeEchoRunner(ModelConfig(model_name="echo", device="cpu"))
+
+    inputs = [{"value": 1, "width": 2}, {"value": 2, "width": 4}, {"value": 3, "width": 2}]
+    results = runner.run_batch(inputs)
+
+    assert results == [
+        {"value": 2.0, "width": 2},
+        {"value": 4.0, "width": 4},
+        {"value": 6.0, "width": 2},
+    ]
+    assert runner.batch_sizes == [1, 2]
+
+
+class FakeGraph:
+    """Stands in for a captured CUDA graph: replay reads the shared static input."""
+
+    def __init__(self, static_input, static_output):
+        self.static_input = static_input
+        self.static_output = static_output
+
+    def replay(self):
+        value = self.static_input.clone()
+        time.sleep(0.001)
+        self.static_output.copy_(value * 2)
+
+
+def test_graph_replay_is_thread_safe():
+    runner = EchoRunner(ModelConfig(model_name="echo", device="cpu"))
+    static_input = torch.zeros(1, 1)
+    static_output = torch.zeros(1, 1)
+    runner._graphs[((1, 1), torch.float32)] = (
+        FakeGraph(static_input, static_output),
+        static_input,
+        static_output,
+    )
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outputs = list(pool.map(lambda v: runner.forward(torch.full((1, 1), float(v))), range(64)))
+
+    assert [output.item() for output in outputs] == [2.0 * v for v in range(64)]
+
+
+def test_inference_task_retries_s3_connect_errors():
+    assert isinstance(EndpointConnectionError(endpoint_url="x"), InferenceTask.autoretry_for)
+    assert isinstance(ConnectTimeoutError(endpoint_url="x"), InferenceTask.autoretry_for)
+    assert not isinstance(ValueError("bad input"), InferenceTask.autoretry_for)
+
+
+def test_submit_task_batched_dispatch_failure(client, mock_celery_app, monkeypatch):
+    ModelRegistry.register("superres-x4", MockModelRunner)
+    monkeypatch.setattr("app.main.settings.batch_size", 2)
+    monkeypatch.setattr("app.main.task_batcher.max_batch_size", 2)
+    mock_celery_app.send_task.side_effect = ConnectionError("broker down")
+
+    task_ids = []
+    for i in range(2):
+        response = client.post(
+            "/v1/tasks",
+            json={
+                "model": "superres-x4",
+                "input": {"image_url": "https://example.com/test.jpg"},
+                "client_request_id": f"batch-failure-{i}",
+            },
+            headers={"x-api-key": "test-key-123"},
+        )
+        assert response.status_code == 202
+        task_ids.append(response.json()["task_id"])
+
+    client.portal.call(asyncio.sleep, 0)
+
+    failed = [call[0][0] for call in mock_celery_app.backend.mark_as_failure.call_args_list]
+    assert failed == task_ids
+    assert client.portal.call(app_module.idempotency_cache.get_task_id, "batch-failure-0") is None
+
+
+def test_submit_task_dispatch_failure(client, mock_celery_app):
+    ModelRegistry.register("superres-x4", MockModelRunner)
+    mock_celery_app.send_task.side_effect = ConnectionError("broker down")
+
+    with pytest.raises(ConnectionError):
+        client.post(
+            "/v1/tasks",
+            json={
+                "model": "superres-x4",
+                "input": {"image_url": "https://example.com/test.jpg"},
+                "client_request_id": "dispatch-failure",
+            },
+            headers={"x-api-key": "test-key-123"},
+        )
+
+    task_id = mock_celery_app.send_task.call_args[1]["task_id"]
+    mock_celery_app.backend.mark_as_failure.assert_called_once()
+    assert mock_celery_app.backend.mark_as_failure.call_args[0][0] == task_id
+    assert client.portal.call(app_module.idempotency_cache.get_task_id, "dispatch-failure") is None
+
+
+class FailingRunner(MockModelRunner):
+    def prepare(self, input_data):
+        raise ValueError("bad input")
+
+
+def test_failed_batch_counts_each_item_once(monkeypatch):
+    ModelRegistry.register("failing-model", FailingRunner)
+    monkeypatch.setattr(process_inference_batch, "backend", Mock())
+    before = task_failed._value.get()
+
+    items = [{"task_id": f"bad-{i}", "input_data": {}, "callback_url": None} for i in range(3)]
+    result = process_inference_batch.apply(args=["failing-model", items])
+
+    assert isinstance(result.result, ValueError)
+    assert task_failed._value.get() - before == 3
+    failed = [call[0][0] for call in process_inference_batch.backend.mark_as_failure.call_args_list]
+    assert {"bad-0", "bad-1", "bad-2"} <= set(failed)